@@ -1,8 +1,19 @@
-from fastapi import FastAPI, Query
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from scraper import run_once
+from fastapi.responses import ORJSONResponse
+from scraper import run_once, browser_pool, get_http_client, close_http_client, _collect_targets
+
+logger = logging.getLogger(__name__)
 
-app = FastAPI()
+# orjson 序列化結果陣列比標準 json 快
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # CORS 設定，方便前端 fetch
 app.add_middleware(
@@ -13,11 +24,82 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def _startup():
+    """
+    啟動時先把瀏覽器池與 HTTP 連線池開好，之後每個請求只借用。
+    Chromium 起不來時只記錄錯誤、服務照常啟動（HTTP 快速路徑與其他端點不受影響），
+    第一次借用分頁時會再試著啟動。
+    """
+    get_http_client()
+    try:
+        await browser_pool.start(n_browsers=2)
+    except Exception as e:
+        logger.error(f"瀏覽器池啟動失敗，改為第一次使用時再啟動：{e}")
+
+@app.on_event("shutdown")
+async def _shutdown():
+    await browser_pool.stop()
+    await close_http_client()
+
 @app.get("/")
 def home():
     """Render 會先打 / 來檢查服務有沒有啟動"""
     return {"message": "Service is running"}
 
+# === /api/status 快取（stale-while-revalidate） ===
+CACHE_FRESH_SECONDS = 10   # 幾秒內直接回快取
+CACHE_STALE_SECONDS = 60   # 幾秒內先回舊資料，背景再更新
+
+CACHE: Dict[str, Tuple[float, dict]] = {}
+REFRESH_TASKS: Dict[str, asyncio.Task] = {}
+
+def _targets(url: str, urls: str) -> List[str]:
+    """呼叫端給的網址（清理 / 去重複沿用 scraper 的規則）：合法的在前、依原本順序"""
+    valid, invalid = _collect_targets(url, urls)
+    return valid + invalid
+
+def _cache_key(targets: List[str]) -> str:
+    """同一組網址（不論順序）對應同一個快取 key"""
+    return ",".join(sorted(targets))
+
+def _in_order(data: dict, targets: List[str]) -> dict:
+    """快取可能是另一種順序的請求寫入的：結果與錯誤依這次呼叫端的順序排回"""
+    rank = {u: i for i, u in enumerate(targets)}
+
+    def pos(item) -> int:
+        return rank.get(item.get("url"), len(rank)) if isinstance(item, dict) else len(rank)
+
+    return {
+        **data,
+        "results": sorted(data.get("results", []), key=pos),
+        "errors": sorted(data.get("errors", []), key=pos),
+    }
+
+async def _scrape_and_cache(key: str, targets: List[str]) -> dict:
+    data = await run_once(urls=",".join(targets))
+    now = time.time()
+    # 全部失敗（例如瀏覽器池掛掉）不進快取，下一個請求直接重試（同 scraper 只快取成功結果）
+    if not any(r.get("success") for r in data.get("results", [])):
+        return data
+    # 結果可能來自 scraper 的單一 URL 快取：以最舊的 scraped_at 計時，舊資料不會被蓋上新時間而延壽
+    scraped = [r.get("scraped_at") or now for r in data.get("results", [])]
+    CACHE[key] = (min(scraped, default=now), data)
+    # 順手清掉已經過了 stale 視窗的 key
+    for k, (ts, _) in list(CACHE.items()):
+        if now - ts > CACHE_STALE_SECONDS:
+            CACHE.pop(k, None)
+    return data
+
+async def _refresh(key: str, targets: List[str]):
+    """背景更新；失敗就保留舊資料，等下一次請求再試"""
+    try:
+        await _scrape_and_cache(key, targets)
+    except Exception as e:
+        logger.error(f"背景更新 {key} 失敗，沿用舊資料：{e}")
+    finally:
+        REFRESH_TASKS.pop(key, None)
+
 @app.get("/api/status")
 async def api_status(
     url: str = Query(None),
@@ -27,39 +109,84 @@ async def api_status(
     抓取票券狀態
     - url: 單一網址
     - urls: 多個網址，用逗號分隔
+    新鮮（≤ CACHE_FRESH_SECONDS）直接回快取；
+    過期但在 CACHE_STALE_SECONDS 內先回舊資料並在背景更新；
+    其餘才同步抓取。
     """
+    targets = _targets(url, urls)
+    key = _cache_key(targets)
+    cached = CACHE.get(key)
+    if cached:
+        age = time.time() - cached[0]
+        if age <= CACHE_FRESH_SECONDS:
+            return _in_order(cached[1], targets)
+        if age <= CACHE_STALE_SECONDS:
+            if key not in REFRESH_TASKS:
+                REFRESH_TASKS[key] = asyncio.create_task(_refresh(key, targets))
+            return _in_order(cached[1], targets)
+
     try:
-        data = await run_once(url=url, urls=urls)
-        return data
+        if not key:
+            return await run_once(url=url, urls=urls)
+        return _in_order(await _scrape_and_cache(key, targets), targets)
     except Exception as e:
         # 這樣即使爬蟲掛掉，也能回 JSON，不會變 500
         return {"results": [], "errors": [str(e)]}
 
 # === Online users (heartbeat) ===
-from pydantic import BaseModel
-import time
-from typing import Dict
-
-ONLINE_SEEN: Dict[str, float] = {}
+# 在線名單預設存在本行程記憶體：多個 uvicorn/gunicorn worker 會各算各的，
+# 所以 in-process 模式請以單一 worker 執行（--workers 1）。
+# 若要多 worker，設定 REDIS_URL 改用 Redis sorted set（score = 最後心跳時間）共享。
 ONLINE_TTL_SECONDS = 60  # 幾秒內算在線
+ONLINE_REDIS_KEY = "online_users"
 
-class Heartbeat(BaseModel):
-    client_id: str
+REDIS_URL = os.environ.get("REDIS_URL")
+redis_client = None
+if REDIS_URL:
+    from redis import asyncio as aioredis
+    redis_client = aioredis.from_url(REDIS_URL)
+
+# 依最近一次心跳時間排序（最舊在前），過期的一律從前面淘汰
+ONLINE_SEEN: "OrderedDict[str, float]" = OrderedDict()
+
+@app.on_event("shutdown")
+async def _close_redis():
+    if redis_client is not None:
+        await redis_client.aclose()
 
 @app.post("/heartbeat")
-async def heartbeat(hb: Heartbeat):
-    """前端每 20 秒呼叫一次，回報使用者仍在線。"""
-    ONLINE_SEEN[hb.client_id] = time.time()
+async def heartbeat(request: Request):
+    """
+    前端每 20 秒呼叫一次，回報使用者仍在線。
+    body 只有 {"client_id": "..."}，直接讀 JSON，省掉 Pydantic model 驗證。
+    """
+    try:
+        client_id = (await request.json()).get("client_id")
+    except (ValueError, AttributeError):
+        client_id = None
+    if not isinstance(client_id, str) or not client_id:
+        raise HTTPException(status_code=422, detail="client_id is required")
+
+    now = time.time()
+    if redis_client is not None:
+        await redis_client.zadd(ONLINE_REDIS_KEY, {client_id: now})
+        return {"ok": True}
+    ONLINE_SEEN.pop(client_id, None)  # 移到最後，維持時間順序
+    ONLINE_SEEN[client_id] = now
     return {"ok": True}
 
 @app.get("/online_count")
 async def online_count():
     """回傳最近 ONLINE_TTL_SECONDS 秒內有回報的使用者數量。"""
     now = time.time()
-    # 清掉過期
-    for cid, ts in list(ONLINE_SEEN.items()):
-        if now - ts > ONLINE_TTL_SECONDS:
-            ONLINE_SEEN.pop(cid, None)
-    # 計算在線
-    return {"count": sum(1 for ts in ONLINE_SEEN.values() if now - ts <= ONLINE_TTL_SECONDS)}
-
+    if redis_client is not None:
+        # 清掉過期 + 計數，一次 round-trip，皆為 O(log N)
+        pipe = redis_client.pipeline()
+        pipe.zremrangebyscore(ONLINE_REDIS_KEY, "-inf", now - ONLINE_TTL_SECONDS)
+        pipe.zcard(ONLINE_REDIS_KEY)
+        _, count = await pipe.execute()
+        return {"count": count}
+    # 只從最舊的一端清掉過期，剩下的都在線
+    while ONLINE_SEEN and now - next(iter(ONLINE_SEEN.values())) > ONLINE_TTL_SECONDS:
+        ONLINE_SEEN.popitem(last=False)
+    return {"count": len(ONLINE_SEEN)}
@@ -2,17 +2,24 @@
 import os
 import re
 import asyncio
+import copy
 import logging
 import time
-from typing import List, Dict, Any, Optional, Union
-from dataclasses import dataclass
-from urllib.parse import urlparse
+from contextlib import asynccontextmanager
+from typing import List, Dict, Any, Optional, Tuple, Union, AsyncIterator
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit, urlunsplit
 
+import httpx
+from selectolax.parser import HTMLParser
 from playwright.async_api import (
     async_playwright,
     TimeoutError as PWTimeout,
     Page,
+    Browser,
     BrowserContext,
+    CDPSession,
+    Response,
 )
 
 # ===== 基本設定 =====
@@ -28,6 +35,151 @@ UA = (
     "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
 )
 
+# 只讀文字內容，以下資源一律擋掉（保留 document / script / xhr / fetch）：
+# 圖片 / 字體 / 影音 / CSS 依副檔名（含帶 query string 的版本），websocket 與廣告追蹤依網址
+_BLOCKED_EXTENSIONS = (
+    "png", "jpg", "jpeg", "gif", "webp", "svg", "ico",
+    "woff", "woff2", "ttf", "otf",
+    "mp4", "m4s", "webm", "mp3",
+    "css",
+)
+_BLOCKED_URL_PATTERNS = [
+    *(f"*.{ext}" for ext in _BLOCKED_EXTENSIONS),
+    *(f"*.{ext}?*" for ext in _BLOCKED_EXTENSIONS),
+    "ws://*",
+    "wss://*",
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+    "*facebook.net*",
+    "*hotjar*",
+    "*doubleclick.net*",
+    "*clarity.ms*",
+]
+
+# 低記憶體 headless 抓取用的 Chromium 參數（關閉背景服務 / 同步 / 元件更新等）
+_CHROMIUM_ARGS = (
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+    "--disable-gpu",
+    "--disable-software-rasterizer",
+    "--disable-background-networking",
+    "--disable-background-timer-throttling",
+    "--disable-backgrounding-occluded-windows",
+    "--disable-breakpad",
+    "--disable-client-side-phishing-detection",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-extensions",
+    "--disable-features=TranslateUI,BlinkGenPropertyTrees,IsolateOrigins,site-per-process",
+    "--disable-hang-monitor",
+    "--disable-ipc-flooding-protection",
+    "--disable-popup-blocking",
+    "--disable-prompt-on-repost",
+    "--disable-renderer-backgrounding",
+    "--disable-sync",
+    "--force-color-profile=srgb",
+    "--metrics-recording-only",
+    "--mute-audio",
+    "--no-first-run",
+    "--password-store=basic",
+    "--use-mock-keychain",
+)
+
+# 剩餘票數解析：全形轉半形表 + 依優先順序排列的樣式（模組載入時建一次）
+_DIGIT_TRANS = str.maketrans("０１２３４５６７８９，", "0123456789,")
+_REMAIN_PATTERNS = (
+    re.compile(r"剩[：:]\s*([0-9,]+)"),  # 剩：123 / 剩:123
+    re.compile(r"餘[：:]\s*([0-9,]+)"),  # 餘：123
+    re.compile(r"還剩\s*([0-9,]+)"),    # 還剩123
+    re.compile(r"([0-9,]+)\s*張?剩"),   # 123張剩 / 123剩
+    re.compile(r"([0-9,]+)"),           # 純數字（最後兜底）
+)
+
+# 場次表 / 場次列
+_TABLE_SELECTOR = ".events__list__table"
+_ROW_SELECTOR = ".column__body"
+_ROWS_SELECTOR = f"{_TABLE_SELECTOR} {_ROW_SELECTOR}"
+
+# 場次資料已就緒：至少一列，且有剩餘票數節點（或頁面已載入完畢）。
+# 只有場次表沒有列時，不能看到 load 就收：JS 渲染頁的場次 XHR 常在 load 之後才回來，
+# 要等 load 結束後再過 graceMs 仍沒有列，才當作真的沒有場次（免得空表等滿 wait_timeout）
+_ROWS_READY_JS = f"""
+(graceMs) => {{
+    if (document.querySelector('{_ROWS_SELECTOR}') !== null) {{
+        return document.querySelector('{_ROWS_SELECTOR} .remain_infos span') !== null
+            || document.readyState === 'complete';
+    }}
+    const nav = performance.getEntriesByType('navigation')[0];
+    return document.querySelector('{_TABLE_SELECTOR}') !== null
+        && !!nav && nav.loadEventEnd > 0
+        && performance.now() - nav.loadEventEnd > graceMs;
+}}
+"""
+
+# 探測用（probe_xhr）：頁面載入期間攔下的場次 API 回應。API 結構未公開，DOM 解析不到時
+# 只記錄候選的剩餘數欄位（欄位名稱完全相符、值為純數字），不當作結果回傳
+_API_URL_RE = re.compile(r"/api/.*(?:event|remain|ticket)", re.I)
+_JSON_REMAIN_KEYS = frozenset({
+    "remain", "remaining", "remainCount", "remainingCount", "remainQty", "remainQuantity",
+})
+_JSON_DATE_KEYS = ("date", "startDate", "startTime", "sessionDate")
+_JSON_DESC_KEYS = ("name", "title", "description", "sessionName")
+_JSON_DIGITS_RE = re.compile(r"[0-9]+")
+
+# 逾時且結構化解析不到場次時的兜底：直接在頁面文字裡找「剩：N / 餘：N」
+_REMAIN_TEXT_RE = re.compile(r"(?:剩|餘)[:：]\s*[0-9０-９,，]+")
+
+# 每列要取的欄位：日期 / 說明 / 剩餘票數文字（瀏覽器與 HTML 解析共用）
+_ROW_FIELD_SELECTORS = (
+    ".date .mr-2",
+    ".date .description",
+    ".priceplans_wrapper .remain_infos > span",
+)
+
+# 活動名稱的候選選擇器（依序嘗試）
+_TITLE_SELECTORS = ("h1.card__title", "h1.program__title", "h1", ".program__title")
+
+# 一次 page.evaluate 取出活動名稱與所有列的 [日期, 說明, 剩餘] 文字
+# 名稱依序嘗試 og:title → 標題選擇器 → <title>；選擇器由參數傳入
+_PAGE_JS = """
+([rowsSelector, fieldSelectors, titleSelectors]) => {
+    const text = (root, sel) => root.querySelector(sel)?.innerText?.trim() || '';
+    const og = document.querySelector('meta[property="og:title"]')?.content?.trim();
+    const title = og
+        || titleSelectors.map(sel => text(document, sel)).find(Boolean)
+        || document.title.trim()
+        || null;
+    const rows = Array.from(document.querySelectorAll(rowsSelector))
+        .map(r => fieldSelectors.map(sel => text(r, sel)));
+    return {title, rows};
+}
+"""
+_PAGE_JS_ARGS = [_ROWS_SELECTOR, list(_ROW_FIELD_SELECTORS), list(_TITLE_SELECTORS)]
+
+# 常見彈窗按鈕（依優先順序）；一次 evaluate 找出第一個可見的就點，沒彈窗時不必逐一等逾時
+_POPUP_TEXTS = ("同意", "接受", "我知道了", "OK", "關閉", "確定", "×")
+_POPUP_JS = """
+(texts) => {
+  const buttons = [...document.querySelectorAll(
+    'button, [role="button"], input[type="button"], input[type="submit"]'
+  )].filter((el) => el.getClientRects().length > 0);
+  const nameOf = (el) =>
+    (el.getAttribute('aria-label') || el.value || el.textContent || '').trim().toLowerCase();
+  for (const text of texts) {
+    const el = buttons.find((b) => nameOf(b).includes(text.toLowerCase()));
+    if (el) { el.click(); return text; }
+  }
+  return null;
+}
+"""
+
+# 直接以 HTTP 取頁面時帶的標頭（與瀏覽器 context 一致）
+_HTTP_HEADERS = {
+    "User-Agent": UA,
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "zh-TW,zh;q=0.9,en;q=0.8",
+}
+
 
 # ===== 資料類 =====
 @dataclass
@@ -37,89 +189,366 @@ class ScrapingConfig:
     retry_delay: float = 2.0
     page_timeout: int = 90_000       # 單頁導覽逾時
     wait_timeout: int = 45_000       # 等待主要元素逾時
-    network_timeout: int = 15_000    # networkidle 等待逾時
-    concurrency: int = 3             # 並發頁面數
+    empty_table_grace: int = 5_000   # 場次表沒有列時，load 後再等幾毫秒才當作沒有場次
+    # 單批並發頁面數：時間幾乎都花在等網路，CPU 數 ×2、上限 8
+    concurrency: int = field(default_factory=lambda: min(8, (os.cpu_count() or 1) * 2))
+    n_browsers: int = 2              # 瀏覽器池常駐的 Chromium 數
+    max_browsers: int = 4            # 滿載時自動擴充的上限
+    tabs_per_browser: int = 25       # 每個 browser 同時開啟的分頁上限
+    prewarm_contexts: Optional[int] = None  # 每個 browser 預先建立的 context 數（預設：一整批分攤到各 browser）
+    context_max_uses: int = 20       # context 服務滿幾頁後關閉重建
+    browser_idle_ttl: float = 120.0  # 多餘 browser 閒置幾秒後關閉
+    janitor_interval: float = 30.0   # janitor 巡檢間隔（秒）
+    result_ttl: float = 15.0         # 單一 URL 結果快取秒數（票數變化以分鐘計）
+    http_fast_path: bool = True      # 先試免瀏覽器的 HTTP 抓取
+    http_timeout: float = 10.0       # HTTP 快速路徑逾時（秒）
+    js_shell_ttl: float = 600.0      # HTML 為 JS 殼的 URL，幾秒內直接走瀏覽器、不再試 HTTP
+    probe_xhr: bool = os.environ.get("OPENTIX_PROBE_XHR") == "1"  # 記錄 JSON XHR 以找出 API
+    single_process: bool = False     # --single-process：RSS 約減半，但多分頁時不穩，極小主機才開
     viewport: Optional[Dict[str, int]] = None
 
     def __post_init__(self):
         if self.viewport is None:
             self.viewport = {"width": 1280, "height": 900}
+        if self.prewarm_contexts is None:
+            # 全部 browser 預熱的 context 合計足以跑滿一批 concurrency，首批不必現建
+            self.prewarm_contexts = -(-self.concurrency // self.n_browsers)
 
 
-# ===== 爬蟲核心 =====
-class TicketScraper:
-    """OpenTix 票券剩餘量爬蟲"""
+# ===== 瀏覽器池（跨請求共用） =====
+@dataclass
+class PooledContext:
+    """池中的 context 與其常駐分頁（用完導回 about:blank 重用，不關閉）"""
+    context: BrowserContext
+    page: Optional[Page] = None
+    cdp: Optional[CDPSession] = None  # 分頁的 CDP session（資源阻擋規則掛在這上面）
+    uses: int = 0                # 已服務的頁數
+
+
+@dataclass
+class BrowserSlot:
+    """池中的單一 Chromium：自己的分頁 Semaphore、預熱好的 context 與使用統計"""
+    browser: Browser
+    sem: asyncio.Semaphore
+    idle: List[PooledContext] = field(default_factory=list)  # 閒置可借用的 context
+    active: int = 0              # 已分派到此 browser（執行中 + 排隊中）的分頁數
+    last_used: float = field(default_factory=time.monotonic)
+    relaunch: Optional["asyncio.Task[None]"] = None  # 斷線後重新啟動中的 task（同一時間只有一個）
+
+
+class BrowserPool:
+    """
+    跨請求共用的 Chromium 池（負載平衡 + 自動擴縮 + context 預熱）：
+    - 啟動時 launch n_browsers 個瀏覽器（FastAPI startup），關機時統一關閉
+    - 每個 URL 分派給 active 最少的 browser；全部滿載時自動多開，上限 max_browsers
+    - 背景 janitor 每 janitor_interval 秒關閉閒置超過 browser_idle_ttl 的多餘 browser
+    - 每個 browser 預先建好 prewarm_contexts 個 context（UA / 語系 / 標頭只設定一次），
+      每頁借用一個、用完 clear_cookies 歸還；服務滿 context_max_uses 頁後關閉重建
+    - context 的分頁不關閉：用完導回 about:blank 留待下次重用，省掉 new_page 成本
+    """
 
     def __init__(self, config: Optional[ScrapingConfig] = None):
         self.config = config or ScrapingConfig()
-        self.browser = None
-        self.context: Optional[BrowserContext] = None
         self.playwright = None
+        self.slots: List[BrowserSlot] = []
+        self._min_browsers = self.config.n_browsers
+        self._janitor_task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self._launching = 0  # 已預留名額、正在鎖外啟動的 browser 數
 
-    async def __aenter__(self):
-        """異步上下文管理器入口"""
-        # ✅ 正確生命週期：使用 start()/stop()，避免對 Playwright 物件呼叫 __aexit__
-        self.playwright = await async_playwright().start()
-        await self._init_browser()
-        return self
-
-    async def __aexit__(self, exc_type, exc_val, exc_tb):
-        """異步上下文管理器退出"""
-        await self._cleanup()
-        if self.playwright:
-            await self.playwright.stop()
-
-    async def _init_browser(self):
-        """初始化瀏覽器與 Context"""
+    async def start(self, n_browsers: Optional[int] = None):
+        """
+        啟動 Playwright 與 n 個瀏覽器（重複呼叫不會重開）。
+        第一次借用分頁時也會自動呼叫；啟動失敗會整個還原，下次呼叫再重試。
+        """
+        async with self._lock:
+            if self.slots:
+                return
+            self._min_browsers = n_browsers or self.config.n_browsers
+            self.playwright = await async_playwright().start()
+            try:
+                for _ in range(self._min_browsers):
+                    self.slots.append(await self._new_slot())
+            except Exception:
+                for slot in self.slots:
+                    await self._close_slot(slot)
+                self.slots = []
+                await self.playwright.stop()
+                self.playwright = None
+                raise
+            self._janitor_task = asyncio.create_task(self._janitor())
+            logger.info(f"瀏覽器池已啟動：{self._min_browsers} 個 Chromium")
+
+    async def stop(self):
+        """關閉 janitor、所有 browser 與 Playwright"""
+        if self._janitor_task:
+            self._janitor_task.cancel()
+            self._janitor_task = None
+        async with self._lock:
+            for slot in self.slots:
+                await self._close_slot(slot)
+            self.slots = []
+            if self.playwright:
+                await self.playwright.stop()
+            self.playwright = None
+
+    @asynccontextmanager
+    async def acquire_page(self) -> AsyncIterator[Page]:
+        """借用一個分頁；離開時歸還分頁、context 與 browser 的名額"""
+        if not self.slots:
+            await self.start()
+
+        slot = await self._pick_slot()
         try:
-            self.browser = await self.playwright.chromium.launch(
-                headless=True,
-                args=[
-                    "--no-sandbox",
-                    "--disable-dev-shm-usage",
-                    "--disable-gpu",
-                    "--disable-extensions",
-                    "--no-first-run",
-                    "--disable-default-apps",
-                ],
-            )
-            self.context = await self.browser.new_context(
-                user_agent=UA,
-                locale="zh-TW",
-                viewport=self.config.viewport,
-                ignore_https_errors=True,
-                java_script_enabled=True,
-                extra_http_headers={
-                    "Accept-Language": "zh-TW,zh;q=0.9,en;q=0.8",
-                    "Upgrade-Insecure-Requests": "1",
-                    "Cache-Control": "no-cache",
-                },
-            )
-            await self._setup_request_interception()
+            async with slot.sem:
+                pooled = await self._checkout_context(slot)
+                healthy = False
+                try:
+                    if pooled.page is None or pooled.page.is_closed():
+                        pooled.page = await self._new_page(pooled)
+                    yield pooled.page
+                    healthy = True
+                finally:
+                    pooled.uses += 1
+                    await self._checkin_context(slot, pooled, healthy)
+        finally:
+            slot.active -= 1
+            slot.last_used = time.monotonic()
+
+    async def _pick_slot(self) -> BrowserSlot:
+        """
+        挑 active 最少的 browser；全部滿載且未達上限時多開一個。
+        開 browser（含預熱）要好幾秒：鎖內只預留名額，啟動在鎖外進行，
+        期間其他借用者與 janitor 不會被擋住（多出來的請求先排進既有 browser）。
+        """
+        async with self._lock:
+            slot = min(self.slots, key=lambda s: s.active)
+            if (
+                slot.active < self.config.tabs_per_browser
+                or len(self.slots) + self._launching >= self.config.max_browsers
+            ):
+                slot.active += 1
+                return slot
+            self._launching += 1
+
+        try:
+            new_slot: Optional[BrowserSlot] = await self._new_slot()
         except Exception as e:
-            logger.error(f"初始化瀏覽器失敗: {e}")
+            logger.error(f"擴充瀏覽器失敗，改排進既有的 browser：{e}")
+            new_slot = None
+
+        async with self._lock:
+            self._launching -= 1
+            if new_slot is not None and self.playwright is None:
+                # 啟動期間瀏覽器池已被 stop()
+                await self._close_slot(new_slot)
+                new_slot = None
+            if new_slot is not None:
+                self.slots.append(new_slot)
+                logger.info(f"所有瀏覽器皆滿載，擴充至 {len(self.slots)} 個")
+                slot = new_slot
+            elif self.slots:
+                slot = min(self.slots, key=lambda s: s.active)
+            else:
+                raise RuntimeError("瀏覽器池已關閉")
+            slot.active += 1
+            return slot
+
+    async def _checkout_context(self, slot: BrowserSlot) -> PooledContext:
+        """
+        取出一個預熱好的 context（沒有就現建）；browser 斷線時重新啟動。
+        重新啟動在鎖外進行：鎖內只登記 relaunch task，同一 slot 的其他借用者等同一個 task。
+        """
+        if not slot.browser.is_connected():
+            async with self._lock:
+                if not slot.browser.is_connected() and slot.relaunch is None:
+                    logger.warning("瀏覽器已斷線，重新啟動")
+                    slot.relaunch = asyncio.create_task(self._relaunch(slot))
+                relaunch = slot.relaunch
+            if relaunch is not None:
+                # shield：單一借用者被取消時，不中斷其他人也在等的重新啟動
+                await asyncio.shield(relaunch)
+        if slot.idle:
+            return slot.idle.pop()
+        return PooledContext(await self._new_context(slot.browser))
+
+    async def _checkin_context(self, slot: BrowserSlot, pooled: PooledContext, healthy: bool):
+        """
+        歸還 context：分頁導回 about:blank、清掉 cookie 放回閒置；出錯或用滿次數則關閉。
+        定期輪替 context 可清掉 Playwright 連線端只增不減的物件表（長跑記憶體洩漏），
+        新 context 下次借用時重建（分頁與資源阻擋規則一併重新建立）。
+        """
+        rotate = pooled.uses >= self.config.context_max_uses
+        if healthy and not rotate and slot.browser.is_connected():
+            try:
+                if pooled.page is not None:
+                    # 只需換掉舊頁面，不必等 load
+                    await pooled.page.goto("about:blank", wait_until="commit")
+                await pooled.context.clear_cookies()
+                slot.idle.append(pooled)
+                return
+            except Exception as e:
+                logger.warning(f"重設 context 失敗，改為關閉: {e}")
+
+        rss_before = _current_rss_mb() if rotate else None
+        try:
+            await pooled.context.close()
+        except Exception as e:
+            logger.error(f"關閉 context 時發生錯誤: {e}")
+        if rotate:
+            rss_after = _current_rss_mb()
+            rss = (
+                f"，本行程 RSS {rss_before:.0f} → {rss_after:.0f} MB"
+                if rss_before is not None and rss_after is not None else ""
+            )
+            logger.info(f"context 已服務 {pooled.uses} 頁，輪替{rss}")
+
+    async def _relaunch(self, slot: BrowserSlot):
+        """重新啟動斷線的 browser；期間 slot 已被 stop() 移出池子的話，新 browser 直接關掉"""
+        try:
+            browser = await self._launch()
+            if slot not in self.slots:
+                await browser.close()
+                raise RuntimeError("瀏覽器池已關閉")
+            slot.browser, slot.idle = browser, []
+        finally:
+            slot.relaunch = None
+
+    async def _janitor(self):
+        """定期關閉閒置過久的多餘 browser（保留 n_browsers 個）；鎖內只移出池子，關閉在鎖外"""
+        while True:
+            await asyncio.sleep(self.config.janitor_interval)
+            now = time.monotonic()
+            expired: List[BrowserSlot] = []
+            async with self._lock:
+                for slot in list(self.slots):
+                    if len(self.slots) <= self._min_browsers:
+                        break
+                    if slot.active == 0 and now - slot.last_used > self.config.browser_idle_ttl:
+                        self.slots.remove(slot)
+                        expired.append(slot)
+            for slot in expired:
+                await self._close_slot(slot)
+                logger.info(f"關閉閒置瀏覽器，剩 {len(self.slots)} 個")
+
+    async def _new_slot(self) -> BrowserSlot:
+        """啟動一個 browser 並預熱 context（連分頁與資源阻擋一起建好，第一次借用不必再等 new_page）"""
+        slot = BrowserSlot(
+            browser=await self._launch(),
+            sem=asyncio.Semaphore(self.config.tabs_per_browser),
+        )
+        try:
+            slot.idle = list(await asyncio.gather(
+                *(self._prewarm_context(slot.browser) for _ in range(self.config.prewarm_contexts))
+            ))
+        except BaseException:
+            # slot 還沒交給呼叫端，這裡不關掉就沒人會關
+            await self._close_slot(slot)
             raise
+        return slot
 
-    async def _setup_request_interception(self):
-        """攔截請求以提升效能（阻擋圖片/字體/影音）"""
-        async def handle_route(route, request):
-            if request.resource_type in {"image", "font", "media"}:
-                await route.abort()
-            else:
-                await route.continue_()
+    async def _prewarm_context(self, browser: Browser) -> PooledContext:
+        """建立 context 並開好它的常駐分頁"""
+        pooled = PooledContext(await self._new_context(browser))
+        pooled.page = await self._new_page(pooled)
+        return pooled
 
-        if self.context:
-            await self.context.route("**/*", handle_route)
+    @staticmethod
+    async def _close_slot(slot: BrowserSlot):
+        """關閉 browser（其下所有 context 一併關閉）"""
+        try:
+            await slot.browser.close()
+        except Exception as e:
+            logger.error(f"關閉瀏覽器時發生錯誤: {e}")
+        slot.idle = []
 
-    async def _cleanup(self):
-        """清理資源"""
+    async def _launch(self) -> Browser:
+        """啟動單一 Chromium"""
         try:
-            if self.context:
-                await self.context.close()
-            if self.browser:
-                await self.browser.close()
+            args = list(_CHROMIUM_ARGS)
+            if self.config.single_process:
+                args.append("--single-process")
+            return await self.playwright.chromium.launch(headless=True, args=args)
         except Exception as e:
-            logger.error(f"清理資源時發生錯誤: {e}")
+            logger.error(f"初始化瀏覽器失敗: {e}")
+            raise
+
+    async def _new_context(self, browser: Browser) -> BrowserContext:
+        """建立 OpenTix 專用設定的 Context（UA / 語系 / 標頭）"""
+        context = await browser.new_context(
+            user_agent=UA,
+            locale="zh-TW",
+            viewport=self.config.viewport,
+            ignore_https_errors=True,
+            java_script_enabled=True,
+            extra_http_headers={
+                "Accept-Language": "zh-TW,zh;q=0.9,en;q=0.8",
+                "Upgrade-Insecure-Requests": "1",
+                "Cache-Control": "no-cache",
+            },
+        )
+        return context
+
+    async def _new_page(self, pooled: PooledContext) -> Page:
+        """
+        建立分頁並以 CDP Network.setBlockedURLs 擋掉不需要的資源。
+        阻擋完全在瀏覽器端完成：不像 context.route 每個子請求都要回 Python 一趟，
+        也不會累積 route handler 的物件（長跑時的主要洩漏來源）。
+        """
+        page = await pooled.context.new_page()
+        cdp = await pooled.context.new_cdp_session(page)
+        await cdp.send("Network.enable")
+        await cdp.send("Network.setBlockedURLs", {"urls": _BLOCKED_URL_PATTERNS})
+        pooled.cdp = cdp
+        return page
+
+
+browser_pool = BrowserPool()
+
+# 全域共用的 HTTP client：連線池與 TLS 連線跨請求重用（FastAPI startup 建立、shutdown 關閉）
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """取得共用 HTTP client（尚未建立或已關閉時才新建）"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            http2=True,
+            headers=_HTTP_HEADERS,
+            timeout=10,
+            follow_redirects=True,
+            # httpx 預設閒置 5 秒就回收；放寬到 60 秒，讓時間相近的請求（多個使用者 / 別名的輪詢）
+            # 沿用同一條 HTTP/2 連線。單一前端每個別名最快 10 分鐘才輪詢一次，那種間隔仍會重新連線
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=60.0),
+        )
+    return _http_client
+
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+# 進行中的抓取（正規化 url -> Task）；同一 URL 同時只跑一次，其餘請求共用結果
+_INFLIGHT: Dict[str, "asyncio.Task[Dict[str, Any]]"] = {}
+
+# 單一 URL 的成功結果快取（正規化 url -> (抓取時間, 結果)），存活 result_ttl 秒
+_RESULT_CACHE: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+# HTML 裡沒有場次表（需 JS 渲染）的 URL（正規化 url -> 發現時間），js_shell_ttl 秒內跳過 HTTP 快速路徑
+_JS_SHELL: Dict[str, float] = {}
+
+
+# ===== 爬蟲核心 =====
+class TicketScraper:
+    """OpenTix 票券剩餘量爬蟲（分頁向瀏覽器池借用）"""
+
+    def __init__(self, pool: BrowserPool):
+        self.pool = pool
+        self.config = pool.config
 
     # ===== 對外：批次抓取 =====
     async def scrape_multiple(self, targets: List[str]) -> Dict[str, Any]:
@@ -140,19 +569,20 @@ class TicketScraper:
 
         sem = asyncio.Semaphore(self.config.concurrency)
 
-        async def worker(url: str):
+        async def worker(url: str) -> Dict[str, Any]:
             async with sem:
-                try:
-                    data = await self._retry_fetch(url)
-                    results.append(data)
-                except Exception as e:
-                    msg = f"{type(e).__name__}: {e}"
-                    logger.error(f"抓取 {url} 失敗: {msg}")
-                    errors.append({"url": url, "error": msg})
-
-        tasks = [worker(u.strip()) for u in targets if u and u.strip()]
-        # 收集所有結果（讓 Exception 不會中斷其它任務）
-        await asyncio.gather(*tasks, return_exceptions=True)
+                return await self._fetch_coalesced(url)
+
+        cleaned = [u.strip() for u in targets if u and u.strip()]
+        # 全部並發執行；Exception 不會中斷其它任務，結果依輸入順序排回
+        done = await asyncio.gather(*(worker(u) for u in cleaned), return_exceptions=True)
+        for url, data in zip(cleaned, done):
+            if isinstance(data, BaseException):
+                msg = f"{type(data).__name__}: {data}"
+                logger.error(f"抓取 {url} 失敗: {msg}")
+                errors.append({"url": url, "error": msg})
+            else:
+                results.append(data)
 
         return {
             "results": results,
@@ -164,6 +594,97 @@ class TicketScraper:
             },
         }
 
+    # ===== 合併重複請求 =====
+    async def _fetch_coalesced(self, url: str) -> Dict[str, Any]:
+        """
+        result_ttl 秒內抓過（成功）的 URL 直接回快取副本；
+        同一 URL 若已在抓取中，直接等待同一個結果，不另開分頁。
+        """
+        key = _canonical_url(url)
+        now = time.time()
+        cached = _RESULT_CACHE.get(key)
+        if cached and now - cached[0] <= self.config.result_ttl:
+            return {**copy.deepcopy(cached[1]), "url": url}
+
+        task = _INFLIGHT.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch_and_cache(key, url))
+            _INFLIGHT[key] = task
+            task.add_done_callback(lambda _t: _INFLIGHT.pop(key, None))
+        else:
+            logger.info(f"{url} 已在抓取中，共用結果")
+        # shield：單一呼叫端被取消時，不影響其他等待同一結果的請求
+        data = await asyncio.shield(task)
+        # 不同寫法（大小寫 / 結尾斜線）共用結果時，url 欄位維持呼叫端給的
+        return data if data["url"] == url else {**data, "url": url}
+
+    async def _fetch_and_cache(self, key: str, url: str) -> Dict[str, Any]:
+        data = await self._fetch(url)
+        if data.get("success"):
+            now = time.time()
+            _RESULT_CACHE[key] = (now, data)
+            # 順手清掉過期的 key
+            for k, (ts, _) in list(_RESULT_CACHE.items()):
+                if now - ts > self.config.result_ttl:
+                    _RESULT_CACHE.pop(k, None)
+        return data
+
+    async def _fetch(self, url: str) -> Dict[str, Any]:
+        """
+        先走免瀏覽器的 HTTP 快速路徑，拿不到場次才開瀏覽器；
+        已知 HTML 是 JS 殼的 URL 在 js_shell_ttl 內直接開瀏覽器，省下注定落空的 HTTP 請求。
+        """
+        if self.config.http_fast_path:
+            key = _canonical_url(url)
+            now = time.time()
+            if now - _JS_SHELL.get(key, 0.0) > self.config.js_shell_ttl:
+                data = await self._fetch_via_http(url)
+                if data is not None:
+                    return data
+        return await self._retry_fetch(url)
+
+    # ===== 免瀏覽器快速路徑 =====
+    async def _fetch_via_http(self, url: str) -> Optional[Dict[str, Any]]:
+        """
+        直接以 HTTP 取活動頁 HTML 並解析場次（伺服器端已渲染時可省掉整個 Chromium）。
+        請求失敗或 HTML 裡沒有場次表（純 JS 殼）時回傳 None，交給 Playwright；
+        有場次表但沒有列（目前無場次）直接回空結果，不必讓瀏覽器等到逾時。
+        """
+        try:
+            resp = await get_http_client().get(url, timeout=self.config.http_timeout)
+            resp.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.info(f"HTTP 快速路徑失敗，改用瀏覽器：{e}")
+            return None
+
+        # 直接把 bytes 交給 selectolax（C 解析器自行解碼），不先在 Python 轉成整份 str
+        tree = HTMLParser(resp.content)
+        table = tree.css_first(_TABLE_SELECTOR)
+        if table is None:
+            logger.info(f"{url} 的 HTML 沒有場次表（JS 殼），改用瀏覽器")
+            now = time.time()
+            _JS_SHELL[_canonical_url(url)] = now
+            # 順手清掉過期的 key
+            for k, ts in list(_JS_SHELL.items()):
+                if now - ts > self.config.js_shell_ttl:
+                    _JS_SHELL.pop(k, None)
+            return None
+        # 只在場次表底下找列，不必再掃整份文件
+        rows = table.css(_ROW_SELECTOR)
+
+        entries = [
+            self._build_entry(*(_node_text(row, sel) for sel in _ROW_FIELD_SELECTORS))
+            for row in rows
+        ]
+        logger.info(f"HTTP 快速路徑找到 {len(entries)} 個場次")
+        return {
+            "url": url,
+            "title": _html_title(tree),
+            "entries": entries,
+            "scraped_at": time.time(),  # 單位：秒（epoch）
+            "success": True,
+        }
+
     # ===== 重試機制 =====
     async def _retry_fetch(self, url: str) -> Dict[str, Any]:
         last_exc: Optional[BaseException] = None
@@ -184,178 +705,147 @@ class TicketScraper:
 
     # ===== 單頁抓取 =====
     async def _fetch_single_page(self, url: str) -> Dict[str, Any]:
-        assert self.context is not None, "Browser context 尚未初始化"
-        page: Page = await self.context.new_page()
-        page.set_default_timeout(self.config.page_timeout)
-
-        try:
-            # 1) 進入頁面
-            await page.goto(url, wait_until="domcontentloaded", timeout=self.config.page_timeout)
-
-            # 2) 等待主要內容 or network 閒置
-            await self._wait_for_content(page)
+        async with self.pool.acquire_page() as page:
+            page.set_default_timeout(self.config.page_timeout)
+            api_responses: List[Response] = []
 
-            # 3) 嘗試處理彈窗（cookie/公告等）
-            await self._handle_popups(page)
+            def capture_api(response: Response):
+                if _API_URL_RE.search(response.url):
+                    api_responses.append(response)
 
-            # 4) 解析活動名稱 + 場次剩餘
-            event_title = await self._get_event_title(page)
-            entries = await self._parse_ticket_info(page)
+            if self.config.probe_xhr:
+                page.on("response", _log_json_response)
+                page.on("response", capture_api)
 
-            return {
-                "url": url,
-                "title": event_title,
-                "entries": entries,
-                "scraped_at": time.time(),  # 單位：秒（epoch）
-                "success": True,
-            }
+            try:
+                # 1) 進入頁面：收到回應標頭就返回，實際就緒由下一步的選擇器等待把關
+                await page.goto(url, wait_until="commit", timeout=self.config.page_timeout)
+
+                # 2) 等待場次資料出現
+                ready = await self._wait_for_content(page)
+
+                # 3) 嘗試處理彈窗（cookie/公告等）
+                await self._handle_popups(page)
+
+                # 4) 解析活動名稱 + 場次剩餘（逾時又解析不到時，改掃頁面文字）
+                event_title, entries = await self._parse_page(page)
+                if not entries and self.config.probe_xhr:
+                    await self._probe_api_responses(url, api_responses)
+                if not entries and not ready:
+                    entries = await self._parse_text_fallback(page)
+
+                return {
+                    "url": url,
+                    "title": event_title,
+                    "entries": entries,
+                    "scraped_at": time.time(),  # 單位：秒（epoch）
+                    "success": True,
+                }
 
-        except Exception as e:
-            logger.error(f"抓取頁面 {url} 時發生錯誤: {e}")
-            return {
-                "url": url,
-                "title": None,
-                "entries": [],
-                "error": str(e),
-                "success": False,
-            }
-        finally:
-            await page.close()
+            except Exception as e:
+                logger.error(f"抓取頁面 {url} 時發生錯誤: {e}")
+                return {
+                    "url": url,
+                    "title": None,
+                    "entries": [],
+                    "error": str(e),
+                    "success": False,
+                }
+            finally:
+                # 分頁會被重用，探測 listener 不能留著
+                if self.config.probe_xhr:
+                    page.remove_listener("response", _log_json_response)
+                    page.remove_listener("response", capture_api)
 
     # ===== 等待內容載入 =====
-    async def _wait_for_content(self, page: Page):
+    async def _wait_for_content(self, page: Page) -> bool:
         """
-        盡量等到場次區塊出現；否則退而求其次等 networkidle。
+        單一 wait_for_function 在瀏覽器內每 200ms 輪詢，場次資料一出現就返回
+        （不依賴不可靠的 networkidle）；逾時回傳 False。
         OpenTix 頁面結構常見：
           <section id="purchase" ...>
             .events__content__list
             .events__list__table
         """
         try:
-            await page.locator(".events__list__table").first.wait_for(
-                timeout=self.config.wait_timeout
+            await page.wait_for_function(
+                _ROWS_READY_JS,
+                arg=self.config.empty_table_grace,
+                timeout=self.config.wait_timeout,
+                polling=200,
             )
+            return True
         except PWTimeout:
-            try:
-                await page.wait_for_load_state("networkidle", timeout=self.config.network_timeout)
-            except PWTimeout:
-                logger.warning("頁面載入逾時（未捕捉到主要元素 / networkidle），將直接嘗試解析")
+            logger.warning("頁面載入逾時（未捕捉到場次列），將直接嘗試解析")
+            return False
 
-    # ===== 處理常見彈窗 =====
-    async def _handle_popups(self, page: Page):
-        popup_texts = ["同意", "接受", "我知道了", "OK", "關閉", "確定", "×"]
-        for text in popup_texts:
+    @staticmethod
+    async def _probe_api_responses(url: str, responses: List[Response]):
+        """探測用：DOM 沒有場次時，記錄 API 回應裡的候選剩餘數欄位（只記錄、不回傳）"""
+        for response in responses:
             try:
-                await page.get_by_role("button", name=text).first.click(timeout=600)
-                await asyncio.sleep(0.4)
-                break
+                payload = await response.json()
             except Exception:
                 continue
+            for fields in _json_remain_fields(payload):
+                logger.info(f"[probe] {url} ← {response.url} 候選場次 (日期, 說明, 剩餘)：{fields}")
 
-    # ===== 解析活動名稱 =====
-    async def _get_event_title(self, page: Page) -> Optional[str]:
-        """
-        依序嘗試：
-        - og:title
-        - 典型 h1/h2 類選擇器
-        - <title>
-        """
+    async def _parse_text_fallback(self, page: Page) -> List[Dict[str, Any]]:
+        """頁面結構對不上時的兜底：從頁面文字抓出每個「剩：N」，沒有日期 / 說明"""
         try:
-            meta = page.locator('meta[property="og:title"]')
-            if await meta.count() > 0:
-                content = await meta.first.get_attribute("content")
-                if content:
-                    return content.strip()
-        except Exception:
-            pass
-
-        for sel in [
-            "h1.card__title",
-            "h1.program__title",
-            "h1",
-            ".program__title",
-        ]:
-            try:
-                loc = page.locator(sel).first
-                if await loc.count() > 0:
-                    txt = (await loc.inner_text()).strip()
-                    if txt:
-                        return txt
-            except Exception:
-                continue
+            text = await page.inner_text("body")
+        except Exception as e:
+            logger.warning(f"讀取頁面文字失敗：{e}")
+            return []
+        entries = [self._build_entry("", "", m.group(0)) for m in _REMAIN_TEXT_RE.finditer(text)]
+        if entries:
+            logger.info(f"以文字兜底找到 {len(entries)} 筆剩餘票數")
+        return entries
 
+    # ===== 處理常見彈窗 =====
+    async def _handle_popups(self, page: Page):
         try:
-            return (await page.title()).strip()
-        except Exception:
-            return None
-
-    # ===== 解析票券資訊（多列） =====
-    async def _parse_ticket_info(self, page: Page) -> List[Dict[str, Any]]:
-        rows = page.locator(".events__list__table .column__body")
-        total = await rows.count()
-        logger.info(f"找到 {total} 個場次")
+            clicked = await page.evaluate(_POPUP_JS, list(_POPUP_TEXTS))
+        except Exception as e:
+            logger.debug(f"檢查彈窗失敗：{e}")
+            return
+        if clicked:
+            logger.info(f"已關閉彈窗：{clicked}")
+            await asyncio.sleep(0.4)
+
+    # ===== 解析活動名稱 + 票券資訊 =====
+    async def _parse_page(self, page: Page) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+        """一次 page.evaluate 在瀏覽器內取出名稱與所有列的文字，不論列數都只有一次 CDP 往返"""
+        data = await page.evaluate(_PAGE_JS, _PAGE_JS_ARGS)
+        rows: List[List[str]] = data["rows"]
+        logger.info(f"找到 {len(rows)} 個場次")
         entries: List[Dict[str, Any]] = []
 
-        for i in range(total):
+        for i, (date_txt, desc_txt, remain_txt) in enumerate(rows):
             try:
-                row = rows.nth(i)
-                entry = await self._parse_single_row(row)
-                if entry:
-                    entries.append(entry)
+                entries.append(self._build_entry(date_txt, desc_txt, remain_txt))
             except Exception as e:
                 logger.warning(f"解析第 {i + 1 } 行失敗：{e}")
                 continue
 
-        return entries
-
-    # ===== 解析單列 =====
-    async def _parse_single_row(self, row) -> Optional[Dict[str, Any]]:
-        try:
-            # 場次日期
-            date_txt = ""
-            try:
-                date_el = row.locator(".date .mr-2").first
-                if await date_el.count() > 0:
-                    date_txt = (await date_el.inner_text()).strip()
-            except Exception:
-                pass
-
-            # 場次說明
-            desc_txt = ""
-            try:
-                desc_el = row.locator(".date .description").first
-                if await desc_el.count() > 0:
-                    desc_txt = (await desc_el.inner_text()).strip()
-            except Exception:
-                pass
-
-            # 剩餘票數文字
-            remain_txt = ""
-            try:
-                remain_el = row.locator(".priceplans_wrapper .remain_infos > span").first
-                if await remain_el.count() > 0:
-                    remain_txt = (await remain_el.inner_text()).strip()
-            except Exception:
-                pass
-
-            # 解析剩餘數
-            remaining = self._extract_remaining_count(remain_txt)
+        return data["title"], entries
 
-            # 組合標籤
-            label = f"{date_txt} {desc_txt}".strip() if (date_txt or desc_txt) else None
+    # ===== 組合單列 =====
+    def _build_entry(self, date_txt: str, desc_txt: str, remain_txt: str) -> Dict[str, Any]:
+        # 解析剩餘數
+        remaining = self._extract_remaining_count(remain_txt)
 
-            # 即使 remaining 解析不到，也回傳原始字串，方便前端顯示
-            return {
-                "label": label,
-                "remaining": remaining,              # 可能是 "123" 或 None
-                "raw_remaining_text": remain_txt,    # 原始字串，例如「剩：123」
-                "date": date_txt,
-                "description": desc_txt,
-            }
+        # 組合標籤
+        label = f"{date_txt} {desc_txt}".strip() if (date_txt or desc_txt) else None
 
-        except Exception as e:
-            logger.error(f"解析行數據時發生錯誤: {e}")
-            return None
+        # 即使 remaining 解析不到，也回傳原始字串，方便前端顯示
+        return {
+            "label": label,
+            "remaining": remaining,              # 可能是 "123" 或 None
+            "raw_remaining_text": remain_txt,    # 原始字串，例如「剩：123」
+            "date": date_txt,
+            "description": desc_txt,
+        }
 
     # ===== 工具：抽取剩餘數字 =====
     def _extract_remaining_count(self, text: str) -> Optional[str]:
@@ -364,15 +854,8 @@ class TicketScraper:
 
         normalized = self._normalize_digits(text)
 
-        patterns = [
-            r"剩[：:]\s*([0-9,]+)",  # 剩：123 / 剩:123
-            r"餘[：:]\s*([0-9,]+)",  # 餘：123
-            r"還剩\s*([0-9,]+)",    # 還剩123
-            r"([0-9,]+)\s*張?剩",   # 123張剩 / 123剩
-            r"([0-9,]+)",           # 純數字（最後兜底）
-        ]
-        for pat in patterns:
-            m = re.search(pat, normalized)
+        for pat in _REMAIN_PATTERNS:
+            m = pat.search(normalized)
             if m:
                 return m.group(1)
         return None
@@ -380,20 +863,180 @@ class TicketScraper:
     @staticmethod
     def _normalize_digits(text: str) -> str:
         """全形數字與逗號轉半形"""
-        table = str.maketrans("０１２３４５６７８９，", "0123456789,")
-        return text.translate(table)
+        return text.translate(_DIGIT_TRANS)
+
+
+# ===== 系統工具 =====
+def _current_rss_mb() -> Optional[float]:
+    """
+    本行程（Playwright 連線端）目前的 RSS（MB），讀 /proc/self/statm 第二欄（常駐頁數）；
+    沒有 /proc 的平台回傳 None。不含 Chromium 子行程。
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+# ===== HTML / 網路工具 =====
+def _canonical_url(url: str) -> str:
+    """快取 / 合併用的 key：host 轉小寫、去掉結尾斜線"""
+    parts = urlsplit(url)
+    return urlunsplit(parts._replace(netloc=parts.netloc.lower(), path=parts.path.rstrip("/")))
+
+
+def _node_text(node, selector: str) -> str:
+    """取子節點文字並壓縮空白（近似 innerText）"""
+    el = node.css_first(selector)
+    return " ".join(el.text().split()) if el else ""
+
+
+def _html_title(tree: HTMLParser) -> Optional[str]:
+    """與 _PAGE_JS 相同順序：og:title → 標題選擇器 → <title>"""
+    meta = tree.css_first('meta[property="og:title"]')
+    if meta and (meta.attributes.get("content") or "").strip():
+        return meta.attributes["content"].strip()
+    for sel in (*_TITLE_SELECTORS, "title"):
+        txt = _node_text(tree, sel)
+        if txt:
+            return txt
+    return None
+
+
+def _json_remain_fields(payload: Any) -> List[Tuple[str, str, str]]:
+    """
+    走訪 JSON，凡是有 _JSON_REMAIN_KEYS 欄位且值為純數字的物件，
+    取出 (日期, 說明, 剩餘數)；日期 / 說明取 _JSON_DATE_KEYS / _JSON_DESC_KEYS 中第一個字串值。
+    """
+    found: List[Tuple[str, str, str]] = []
+
+    def first_str(node: Dict[str, Any], keys: Tuple[str, ...]) -> str:
+        return next((node[k].strip() for k in keys if isinstance(node.get(k), str)), "")
+
+    def remain_value(v: Any) -> Optional[str]:
+        if isinstance(v, int) and not isinstance(v, bool) and v >= 0:
+            return str(v)
+        if isinstance(v, str) and _JSON_DIGITS_RE.fullmatch(v.strip()):
+            return v.strip()
+        return None
+
+    def walk(node: Any):
+        if isinstance(node, dict):
+            for k in _JSON_REMAIN_KEYS.intersection(node):
+                remain = remain_value(node[k])
+                if remain is not None:
+                    found.append((first_str(node, _JSON_DATE_KEYS), first_str(node, _JSON_DESC_KEYS), remain))
+                    break
+            for v in node.values():
+                walk(v)
+        elif isinstance(node, list):
+            for v in node:
+                walk(v)
+
+    walk(payload)
+    return found
+
+
+def _log_json_response(response):
+    """探測用：記錄頁面載入期間回傳 JSON 的 XHR，用來找出 OpenTix 的場次 API"""
+    try:
+        if response.request.resource_type in {"xhr", "fetch"} and "json" in (
+            response.headers.get("content-type") or ""
+        ):
+            logger.info(f"[probe] JSON {response.status} {response.url}")
+    except Exception:
+        pass
+
+
+# ===== 跨請求批次：把同時段的單一 URL 請求併成一批 =====
+class _UrlBatcher:
+    """
+    各自進來的單一 URL 請求先排隊，湊滿 max_batch_size 或等滿 max_queue_time 秒
+    就一起交給 scrape_multiple，共用同一批的並發上限與重複 URL 合併。
+    """
+
+    def __init__(self, max_batch_size: int = 8, max_queue_time: float = 0.05):
+        self.max_batch_size = max_batch_size
+        self.max_queue_time = max_queue_time
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()  # 保留執行中批次的參考，避免被 GC
+
+    async def process(self, url: str) -> Dict[str, Any]:
+        """排入一個 URL，回傳只含該 URL 的 scrape_multiple 格式結果"""
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((url, fut))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_queue_time, self._flush)
+        return await fut
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]):
+        urls = list(dict.fromkeys(u for u, _ in batch))
+        logger.info(f"批次抓取 {len(urls)} 個 URL（{len(batch)} 個請求）")
+        try:
+            result = await TicketScraper(browser_pool).scrape_multiple(urls)
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+
+        by_url = {r["url"]: r for r in result["results"]}
+        errors_by_url = {e["url"]: e for e in result["errors"] if isinstance(e, dict)}
+        for url, fut in batch:
+            if fut.done():  # 呼叫端已取消
+                continue
+            results = [by_url[url]] if url in by_url else []
+            errors = [errors_by_url[url]] if url in errors_by_url else []
+            fut.set_result({
+                "results": results,
+                "errors": errors,
+                "summary": {"total": 1, "success": len(results), "failed": len(errors)},
+            })
+
+
+_BATCHER = _UrlBatcher()
 
 
 # ===== 對外主函式 =====
+# 只收 opentix.life / www.opentix.life 且路徑含 /event/ 的網址（不必為每個網址建 ParseResult）
+# scheme 與 host 不分大小寫（同 URL 規範；快取 key 再由 _canonical_url 統一轉小寫），路徑維持區分
+_OPENTIX_URL_RE = re.compile(r"^(?i:https?://(?:www\.)?opentix\.life)/(?:[^?#]*/)?event/")
+
+
 def _is_valid_opentix_url(url: str) -> bool:
     """驗證是否為有效的 OpenTix event URL"""
-    if not url or not url.startswith(("http://", "https://")):
-        return False
-    try:
-        parsed = urlparse(url)
-        return parsed.netloc in {"opentix.life", "www.opentix.life"} and "/event/" in parsed.path
-    except Exception:
-        return False
+    return bool(url) and _OPENTIX_URL_RE.match(url) is not None
+
+
+def _collect_targets(url: Optional[str], urls: Optional[str]) -> Tuple[List[str], List[str]]:
+    """一次走過輸入：切逗號、去空白、去重複（保留順序）並檢核，回傳 (合法, 不合法)"""
+    src = urls.split(",") if urls else ([url] if url else [])
+    valid: List[str] = []
+    invalid: List[str] = []
+    seen = set()
+    for t in src:
+        t = t.strip()
+        if not t or t in seen:
+            continue
+        seen.add(t)
+        (valid if _is_valid_opentix_url(t) else invalid).append(t)
+    return valid, invalid
 
 
 async def run_once(url: Optional[str] = None, urls: Optional[str] = None) -> Dict[str, Any]:
@@ -403,27 +1046,15 @@ async def run_once(url: Optional[str] = None, urls: Optional[str] = None) -> Dic
     - 多個 url（逗號分隔）：run_once(urls="url1,url2,...")
     回傳：同 scrape_multiple
     """
-    # 蒐集/清理輸入
-    targets: List[str] = []
-    if urls:
-        targets = [u.strip() for u in urls.split(",") if u and u.strip()]
-    elif url:
-        targets = [url.strip()]
-
-    if not targets:
+    valid_targets, invalid_urls = _collect_targets(url, urls)
+    if not valid_targets and not invalid_urls:
         return {"results": [], "errors": ["no url provided"]}
 
-    # 檢核 URL
-    valid_targets: List[str] = []
-    invalid_urls: List[str] = []
-    for t in targets:
-        if _is_valid_opentix_url(t):
-            valid_targets.append(t)
-        else:
-            invalid_urls.append(t)
-
-    async with TicketScraper() as scraper:
-        result = await scraper.scrape_multiple(valid_targets)
+    if len(valid_targets) == 1:
+        # 單一 URL：與同時段其他請求併批
+        result = await _BATCHER.process(valid_targets[0])
+    else:
+        result = await TicketScraper(browser_pool).scrape_multiple(valid_targets)
 
     # 附上不合法 URL 錯誤
     for bad in invalid_urls:
@@ -440,10 +1071,8 @@ async def scrape_status(url: str) -> Dict[str, Any]:
 
 async def scrape_event_pages(urls: Union[List[str], str]) -> Dict[str, Any]:
     """批量抓取（向後相容）；可接收 list 或逗號字串"""
-    if isinstance(urls, (list, tuple)):
-        joined = ",".join([str(u).strip() for u in urls if str(u).strip()])
-    else:
-        joined = str(urls).strip()
+    # 去空白 / 空值交給 run_once 一併處理
+    joined = ",".join(map(str, urls)) if isinstance(urls, (list, tuple)) else str(urls)
     return await run_once(urls=joined)
 
 
@@ -459,7 +1088,11 @@ if __name__ == "__main__":
         if not test_urls:
             print("請填入測試 URL 後再執行。")
             return
-        data = await run_once(urls=",".join(test_urls))
+        try:
+            data = await run_once(urls=",".join(test_urls))
+        finally:
+            await browser_pool.stop()
+            await close_http_client()
         from pprint import pprint
         pprint(data)
 